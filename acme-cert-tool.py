@@ -2,15 +2,23 @@
 
 import itertools as it, operator as op, functools as ft
 import os, sys, stat, tempfile, contextlib, logging, re, pathlib as pl
-import time, math, base64, hashlib, json, email.utils, textwrap
+import time, base64, hashlib, json, email.utils, threading
 
-from urllib.request import urlopen, Request, URLError, HTTPError
+import http.client, urllib.parse, urllib.request
+
+try: import pybase64 as b64 # much faster simd base64 encoders, if available
+except ImportError: b64 = base64
 
 import cryptography # cryptography.io
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa, ec
-from cryptography.hazmat.backends import default_backend
-crypto_backend = default_backend()
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, Prehashed
+
+# Stateless crypto parameter objects, reused for all keys/signatures
+crypto_ec_curve = ec.SECP384R1()
+crypto_sha256, crypto_sha384 = hashes.SHA256(), hashes.SHA384()
+crypto_rs256_padding, crypto_rs256_prehashed = padding.PKCS1v15(), Prehashed(crypto_sha256)
+crypto_es384_prehashed = ec.ECDSA(Prehashed(crypto_sha384))
 
 
 acme_ca_shortcuts = dict(
@@ -43,14 +51,17 @@ def safe_replacement(path, *open_args, mode=None, **open_kws):
 		dir=os.path.dirname(path), prefix=os.path.basename(path)+'.' )
 	if not open_args: open_kws['mode'] = 'w'
 	with tempfile.NamedTemporaryFile(*open_args, **open_kws) as tmp:
+		done = False
 		try:
 			if mode is not None: os.fchmod(tmp.fileno(), mode)
 			yield tmp
 			if not tmp.closed: tmp.flush()
-			os.rename(tmp.name, path)
+			os.replace(tmp.name, path)
+			done = True
 		finally:
-			try: os.unlink(tmp.name)
-			except OSError: pass
+			if not done:
+				try: os.unlink(tmp.name)
+				except OSError: pass
 
 
 class adict(dict):
@@ -58,19 +69,16 @@ class adict(dict):
 		super().__init__(*args, **kwargs)
 		self.__dict__ = self
 
-def p(*a, file=None, end='\n', flush=False, **k):
-	if len(a) > 0:
-		fmt, a = a[0], a[1:]
-		a, k = ( ([fmt.format(*a,**k)], dict())
-			if isinstance(fmt, str) and (a or k)
-			else ([fmt] + list(a), k) )
-	print(*a, file=file, end=end, flush=flush, **k)
+json_dumps = ft.partial(json.dumps, separators=(',', ':')) # compact json for requests
 
 indent_lines = lambda text,indent='  ',prefix='\n': (
 	(prefix if text else '') +
 		''.join(f'{indent}{line}' for line in text.splitlines(keepends=True)) )
 
-p_err = lambda *a,**k: p(*a, file=sys.stderr, **k) or 1
+def p_err(fmt, *a, **k):
+	'Print error message to stderr, formatted if there are args, and return 1 exit code.'
+	print(fmt.format(*a, **k) if a or k else fmt, file=sys.stderr)
+	return 1
 
 def retries_within_timeout( tries, timeout,
 		backoff_func=lambda e,n: ((e**n-1)/e), slack=1e-2 ):
@@ -92,8 +100,8 @@ def p_err_for_req(res, final=False):
 			try: res_json = json.loads(res.body.decode())
 			except ValueError: pass
 			else:
-				if ( res_json['status'] == 400 and
-						res_json['type'] == 'urn:acme:error:badNonce' ):
+				if ( res_json['status'] == 400 and res_json['type'] in [
+						'urn:ietf:params:acme:error:badNonce', 'urn:acme:error:badNonce' ] ):
 					raise ACMEAuthRetry('bad_nonce', res)
 	return p_err(
 		'Server response: {} {}\nHeaders: {}Body: {}',
@@ -103,38 +111,35 @@ def p_err_for_req(res, final=False):
 		indent_lines((res.body or b'').decode()) )
 
 
-def zero_pad(data, bs):
-	data = data.lstrip(b'\0')
-	if len(data) < bs: data = b'\0'*(bs - len(data)) + data
-	assert len(data) == bs
-	return data
-
 def b64_b2a_jose(data, uint_len=None):
 	# https://jose.readthedocs.io/en/latest/
 	# https://tools.ietf.org/html/draft-ietf-jose-json-web-signature-37#appendix-C
 	if uint_len is not None:
+		if uint_len is True: uint_len = (data.bit_length() + 7) >> 3
 		data = data.to_bytes(uint_len, 'big', signed=False)
 		# print(':'.join(f'{b:02x}' for b in data))
 	if isinstance(data, str): data = data.encode()
-	return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+	return b64.urlsafe_b64encode(data).rstrip(b'=').decode()
 
 def generate_crypto_key(key_type):
 	if key_type.startswith('rsa-'):
 		key_bits = int(key_type[4:])
 		if key_bits not in [2048, 4096]: return
-		return rsa.generate_private_key(65537, key_bits, crypto_backend)
+		if key_bits > 2048: log.warning( 'Generating {} key,'
+			' which can take a while (ec-384 keys are much faster to generate)', key_type )
+		return rsa.generate_private_key(65537, key_bits)
 	elif key_type.startswith('ec-'):
 		if key_type != 'ec-384': return
-		return ec.generate_private_key(ec.SECP384R1(), crypto_backend)
+		return ec.generate_private_key(crypto_ec_curve)
 
 
 class AccKey:
 
-	_slots = 't sk pk_hash jwk jwk_thumbprint jws_alg sign_func'.split()
-	def __init__(self, *args, **kws):
-		for k,v in it.chain(zip(self._slots, args), kws.items()): setattr(self, k, v)
-		self.jwk, self.jwk_thumbprint = self._jwk()
-		self.jws_alg, self.sign_func = self._sign_func()
+	__slots__ = 't sk pk_hash jwk jwk_json jwk_thumbprint jws_alg jws_hash sign_func'.split()
+	def __init__(self, t, sk):
+		self.t, self.sk = t, sk
+		self.jwk, self.jwk_json, self.jwk_thumbprint = self._jwk()
+		self.jws_alg, self.jws_hash, self.sign_func = self._sign_func()
 		self.pk_hash = self._pk_hash() # only used to id keys in this script
 
 	def _jwk(self):
@@ -142,49 +147,47 @@ class AccKey:
 		pk_nums = self.sk.public_key().public_numbers()
 		if self.t.startswith('rsa-'):
 			jwk = dict( kty='RSA',
-				n=b64_b2a_jose(pk_nums.n, int(self.t[4:]) // 16),
+				n=b64_b2a_jose(pk_nums.n, True),
 				e=b64_b2a_jose(pk_nums.e, 3) )
 		elif self.t == 'ec-384':
 			jwk = dict( kty='EC', crv='P-384',
 				x=b64_b2a_jose(pk_nums.x, 48),
 				y=b64_b2a_jose(pk_nums.y, 48) )
 		else: raise ValueError(self.t)
-		digest = hashes.Hash(hashes.SHA256(), crypto_backend)
-		digest.update(json.dumps(jwk, sort_keys=True, separators=(',', ':')).encode())
+		# Same canonical json is used for thumbprint and pre-serialized for jws headers
+		jwk_json = json_dumps(jwk, sort_keys=True)
+		digest = hashlib.sha256(jwk_json.encode()).digest()
 		# log.debug('Key JWK: {}', jwk)
-		return jwk, b64_b2a_jose(digest.finalize())
+		return jwk, jwk_json, b64_b2a_jose(digest)
 
-	def _pk_hash(self, trunc_len=8):
-		digest = hashes.Hash(hashes.SHA256(), crypto_backend)
-		digest.update('\0'.join([self.t, self.jwk_thumbprint]).encode())
-		return b64_b2a_jose(digest.finalize())[:trunc_len]
+	def _pk_hash(self, digest_len=6):
+		# Short local id, so blake2b with native truncation is used, 6B -> 8 b64 chars
+		digest = hashlib.blake2b(digest_size=digest_len)
+		digest.update(f'{self.t}\0{self.jwk_thumbprint}'.encode())
+		return b64_b2a_jose(digest.digest())
 
 	def _sign_func(self):
 		# https://tools.ietf.org/html/rfc7518#section-3.1
+		# Returned sign_func expects digest from hashlib func, to sign its result as-is
 		if self.t.startswith('rsa-'):
 			# https://tools.ietf.org/html/rfc7518#section-3.1 mandates pkcs1.5
-			alg, sign_func = 'RS256', ft.partial( self.sk.sign,
-				padding=padding.PKCS1v15(), algorithm=hashes.SHA256() )
+			alg, hash_func, sign_func = 'RS256', hashlib.sha256, ft.partial( self.sk.sign,
+				padding=crypto_rs256_padding, algorithm=crypto_rs256_prehashed )
 		elif self.t == 'ec-384':
-			alg, sign_func = 'ES384', ft.partial(self._sign_func_es384, self.sk)
+			alg, hash_func = 'ES384', hashlib.sha384
+			sign_func = ft.partial(self._sign_func_es384, self.sk)
 		else: raise ValueError(self.t)
-		return alg, sign_func
+		return alg, hash_func, sign_func
 
 	@staticmethod
-	def _sign_func_es384(sk, data):
+	def _sign_func_es384(sk, digest):
 		# cryptography produces ASN.1 DER signature only,
 		#  while ACME expects "r || s" values from there, so it have to be decoded.
-		# Resulting DER struct: 0x30 b1 ( 0x02 b2 (vr) 0x02 b3 (vs) )
-		#  where: b1 = length of stuff after it, b2 = len(vr), b3 = len(vs)
-		#  vr and vs are encoded as signed ints, so can have extra leading 0x00
+		# Both values are zero-padded to 48 bytes for P-384.
 		# See JWA - https://tools.ietf.org/html/rfc7518#section-3.4
-		sig_der = sk.sign(data, signature_algorithm=ec.ECDSA(hashes.SHA384()))
-		rs_len, rn, r_len = sig_der[1], 4, sig_der[3]
-		sn, s_len = rn + r_len + 2, sig_der[rn + r_len + 1]
-		assert sig_der[0] == 0x30 and sig_der[rn-2] == sig_der[sn-2] == 0x02
-		assert rs_len + 2 == len(sig_der) == r_len + s_len + 6
-		r, s = zero_pad(sig_der[rn:rn+r_len], 48), zero_pad(sig_der[sn:sn+s_len], 48)
-		return r + s
+		sig_der = sk.sign(digest, signature_algorithm=crypto_es384_prehashed)
+		r, s = decode_dss_signature(sig_der)
+		return r.to_bytes(48, 'big') + s.to_bytes(48, 'big')
 
 	@classmethod
 	def generate_to_file(cls, p_acc_key, key_type, file_mode=None):
@@ -200,9 +203,8 @@ class AccKey:
 		return acc_key
 
 	@classmethod
-	def load_from_file(cls, p_acc_key):
-		acc_key = serialization.load_pem_private_key(
-			p_acc_key.read_bytes(), None, crypto_backend )
+	def load_from_bytes(cls, acc_key_buff):
+		acc_key = serialization.load_pem_private_key(acc_key_buff, None)
 		if isinstance(acc_key, rsa.RSAPrivateKey):
 			assert acc_key.key_size in [2048, 4096]
 			acc_key_t = f'rsa-{acc_key.key_size}'
@@ -214,111 +216,160 @@ class AccKey:
 
 class AccMeta(dict):
 
-	re_meta = re.compile(r'^\s*## acme\.(\S+?): (.*)?\s*$')
+	re_meta = re.compile(r'^\s*## acme\.(\S+?): (.*)?\s*$', re.M)
+	re_meta_lines_b = re.compile(rb'^[^\S\n]*## acme\.\S+?: .*(?:\n|\Z)', re.M)
 
 	__slots__ = 'p mode'.split()
 	def __init__(self, *args, **kws):
 		for k,v in it.chain(zip(self.__slots__, args), kws.items()): setattr(self, k, v)
 
 	@classmethod
-	def load_from_key_file(cls, p_acc_key, file_mode=None):
+	def load_from_key_file(cls, p_acc_key, file_mode=None, acc_key_buff=None):
+		'Load meta from key file, or its contents in acc_key_buff, if already read.'
 		self = cls(p_acc_key, file_mode)
-		with p_acc_key.open() as src:
-			for line in src:
-				m = self.re_meta.search(line)
-				if not m: continue
-				k, v = m.groups()
-				self[k] = json.loads(v)
+		if acc_key_buff is None: acc_key_buff = p_acc_key.read_bytes()
+		for m in self.re_meta.finditer(acc_key_buff.decode()):
+			k, v = m.groups()
+			self[k] = json.loads(v)
 		return self
 
 	def save(self):
-		with safe_replacement(self.p, mode=self.mode) as dst:
-			with self.p.open() as src:
-				final_newline = True
-				for line in src:
-					m = self.re_meta.search(line)
-					if m: continue
-					dst.write(line)
-					final_newline = line.endswith('\n')
-			if not final_newline: dst.write('\n')
-			for k, v in self.items():
-				if v is None: continue
-				dst.write(f'## acme.{k}: {json.dumps(v)}\n')
-
-
-class ACMEServer(str): __slots__ = 'd', # /directory cache
+		# All old meta lines are dropped in one regexp pass over the whole file
+		buff = self.re_meta_lines_b.sub(b'', self.p.read_bytes())
+		if buff and not buff.endswith(b'\n'): buff += b'\n'
+		for k, v in self.items():
+			if v is None: continue
+			buff += f'## acme.{k}: {json_dumps(v)}\n'.encode()
+		with safe_replacement(self.p, 'wb', mode=self.mode) as dst: dst.write(buff)
+
+
+class ACMEServer(str): __slots__ = 'd', 'nonce' # /directory cache, unused Replay-Nonce
 
 class HTTPResponse:
 
-	# Note: headers are set as-is from urllib response headers,
+	# Note: headers are set as-is from http.client response headers,
 	#  which are HTTPMessage, based on email.message.Message,
 	#  and are matched there in case-insensitive manner.
 	__slots__ = 'code reason headers body'.split()
 
-	def __init__(self, *args, **kws):
-		for k,v in it.chain( zip(self.__slots__, it.repeat(None)),
-			zip(self.__slots__, args), kws.items() ): setattr(self, k, v)
+	def __init__(self, code=None, reason=None, headers=None, body=None):
+		self.code, self.reason, self.headers, self.body = code, reason, headers, body
 
 	def json(self): return json.loads(self.body.decode())
 
 http_req_headers = { 'Content-Type': 'application/jose+json',
 	'User-Agent': 'acme-cert-tool/1.0 (+https://github.com/mk-fg/acme-cert-tool)' }
 
-def http_req(url, data=None, headers=None, **req_kws):
+http_conns = dict() # (scheme, netloc, proxy) -> idle keep-alive connections, reused between requests
+http_redirects = 10
+
+def http_proxy(url):
+	'Return (netloc, auth-headers) for proxy from env (http_proxy, no_proxy, etc) or (None, None).'
+	proxy = urllib.request.getproxies().get(url.scheme)
+	if not proxy or urllib.request.proxy_bypass(url.hostname or ''): return None, None
+	proxy = urllib.parse.urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+	proxy_netloc, proxy_headers = proxy.netloc.rsplit('@', 1)[-1], dict()
+	if proxy.username is not None:
+		auth = urllib.parse.unquote(proxy.username)
+		auth += ':' + urllib.parse.unquote(proxy.password or '')
+		proxy_headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(auth.encode()).decode()
+	return proxy_netloc, proxy_headers
+
+def http_conn_req(url, method, data, headers):
+	'Send request over persistent per-host connection, reconnecting if it was closed.'
+	url = urllib.parse.urlsplit(url)
+	path = url.path or '/'
+	if url.query: path += f'?{url.query}'
+	proxy, proxy_headers = http_proxy(url)
+	if proxy and url.scheme != 'https': # plain http is sent to proxy with full url
+		path, headers = f'{url.scheme}://{url.netloc}{path}', dict(headers, **proxy_headers)
+	conn_k = url.scheme, url.netloc, proxy
+	conns = http_conns.setdefault(conn_k, list()) # pop/append are thread-safe
+	while True:
+		try: conn, reused = conns.pop(), True
+		except IndexError:
+			conn, reused = ( http.client.HTTPSConnection
+				if url.scheme == 'https' else http.client.HTTPConnection )(proxy or url.netloc), False
+			if proxy and url.scheme == 'https': conn.set_tunnel(url.netloc, headers=proxy_headers)
+		try:
+			conn.request(method, path, data, headers)
+			r = conn.getresponse()
+			res = HTTPResponse(r.status, r.reason, r.headers, r.read())
+		except (http.client.HTTPException, OSError) as err:
+			conn.close()
+			if reused and isinstance(err, ( http.client.RemoteDisconnected,
+				ConnectionResetError, BrokenPipeError )): continue # stale keep-alive connection
+			return HTTPResponse(reason=str(err))
+		conns.append(conn)
+		return res
+
+def http_req(url, data=None, headers=None, method=None):
 	req_headers = http_req_headers.copy()
 	if headers: req_headers.update(headers)
-	req = Request(url, data, req_headers, **req_kws)
-	try:
-		try: r = urlopen(req)
-		except HTTPError as err: r = err
-		res = HTTPResponse(r.getcode(), r.reason, r.headers, r.read())
-		r.close()
-	except URLError as r: res = HTTPResponse(reason=r.reason)
+	if not method: method = 'GET' if data is None else 'POST'
+	for n in range(http_redirects + 1):
+		res = http_conn_req(url, method, data, req_headers)
+		if not ( res.code in [301, 302, 303, 307, 308]
+			and method in ['GET', 'HEAD'] and res.headers.get('Location') ): break
+		url = urllib.parse.urljoin(url, res.headers['Location'])
 	return res
 
 def signed_req_body(acc_key, payload, nonce=None, kid=None, url=None, encode=True):
-	protected = dict(alg=acc_key.jws_alg, url=url)
-	if not kid: protected['jwk'] = acc_key.jwk
-	else: protected['kid'] = kid
+	# Protected header is assembled from pre-serialized parts to avoid re-encoding jwk
+	protected = [f'"alg":"{acc_key.jws_alg}"']
+	if not kid: protected.append(f'"jwk":{acc_key.jwk_json}')
+	else: protected.append(f'"kid":{json_dumps(kid)}')
 	if nonce: # only keyChange requires no-nonce payload
-		if not re.search(r'^[-_a-zA-Z0-9]+$', nonce):
+		if not re.fullmatch(r'[-_a-zA-Z0-9]+', nonce):
 			# rfc8555#section-6.5.1 says that client MUST validate nonce
 			raise ACMEError(f'Invalid nonce format: {nonce}')
-		protected['nonce'] = nonce
-	if url: protected['url'] = url
-	protected = b64_b2a_jose(json.dumps(protected))
+		protected.append(f'"nonce":"{nonce}"')
+	protected.append(f'"url":{json_dumps(url)}')
+	protected = b64_b2a_jose('{' + ','.join(protected) + '}')
 	if not isinstance(payload, str):
-		if not isinstance(payload, bytes): payload = json.dumps(payload)
+		if not isinstance(payload, bytes): payload = json_dumps(payload)
 		payload = b64_b2a_jose(payload)
-	signature = b64_b2a_jose(
-		acc_key.sign_func(f'{protected}.{payload}'.encode()) )
+	digest = acc_key.jws_hash(protected.encode()) # signing input is hashed in parts
+	digest.update(b'.')
+	digest.update(payload.encode())
+	signature = b64_b2a_jose(acc_key.sign_func(digest.digest()))
 	body = dict(protected=protected, payload=payload, signature=signature)
-	if encode: body = json.dumps(body).encode()
+	if encode: body = json_dumps(body).encode()
 	return body
 
+acme_nonce_lock = threading.Lock() # for ACMEServer.nonce, with parallel requests
+
+def acme_dir(acme_url):
+	'Return ACME /directory data, only fetching it once per ACMEServer.'
+	if not acme_url.d:
+		log.debug('Sending acme-directory http request to: {!r}', acme_url)
+		res = http_req(acme_url)
+		assert res.code == 200, [res.code, res.reason]
+		acme_url.d = adict(res.json())
+	return acme_url.d
+
 def signed_req(acc_key, url, payload='', kid=None, nonce=None, acme_url=None):
 	url_full = url if ':' in url else None
 	if not url_full or not nonce:
 		assert acme_url, [url, acme_url] # need to query directory
-		if not acme_url.d:
-			log.debug('Sending acme-directory http request to: {!r}', acme_url)
-			with urlopen(acme_url) as r:
-				assert r.getcode() == 200
-				acme_url.d = adict(json.load(r))
+		acme_dir(acme_url)
 		if not url_full:
 			try: url_full = acme_url.d[url]
 			except KeyError:
 				log.debug('Missing directory entry {!r}: {}', url, acme_url.d)
 				raise
+		if not nonce: # nonce from last response is used, if any
+			with acme_nonce_lock: nonce, acme_url.nonce = acme_url.nonce, None
 		if not nonce:
-			with urlopen(acme_url.d.newNonce) as r:
-				nonce = r.headers['Replay-Nonce']
+			res = http_req(acme_url.d.newNonce, method='HEAD')
+			nonce = res.headers['Replay-Nonce']
 	body = signed_req_body(acc_key, payload, kid=kid, nonce=nonce, url=url_full)
 	log.debug('Sending signed http request to URL: {!r} ...', url_full)
 	# log.debug('Signed request body: {}', indent_lines(
 	# 	json.dumps(json.loads(body), sort_keys=True, indent=2) ))
 	res = http_req(url_full, body)
 	log.debug('... http response: {} {}', res.code or '-', res.reason or '?')
+	if acme_url and res.headers: acme_url.nonce = res.headers.get('Replay-Nonce')
 	return res
 
 
@@ -397,19 +448,13 @@ def acme_auth_retry(func, *args, retry_n=0, retry_timeout=0, **kws):
 	'Wrapper to retry requests for bad nonces or any known server issues.'
 	delays = ( retries_within_timeout(retry_n, retry_timeout)
 		if (retry_n or 0) > 0 and (retry_timeout or 0) > 0 else list() )
-	kws_for_attempt = dict()
 	for delay in delays + [0]:
-		func_kws = kws.copy()
-		if kws_for_attempt:
-			func_kws.update(kws_for_attempt)
-			kws_for_attempt.clear()
-		try: func_res = func(*args, **func_kws)
+		# Replay-Nonce from bad_nonce response is cached by signed_req for next attempt
+		try: func_res = func(*args, **kws)
 		except ACMEAuthRetry as err:
 			err_type, err_res = err.args
 			log.debug( 'Got known ACME auth issue {!r}, retry in: {}',
 				err_type, f'{delay:.1f}s' if delay else 'no-retries-left' )
-			if err_type == 'bad_nonce' and 'Replay-Nonce' in res.headers:
-				kws_for_attempt['nonce'] = res.headers['Replay-Nonce']
 		else: return func_res
 		if delay: time.sleep(delay)
 	return p_err_for_req(err_res, final=True)
@@ -453,7 +498,7 @@ def cert_gen(key_type_list, cert_domain_list, cert_name_attrs):
 		ci.key = generate_crypto_key(key_type)
 		if not ci.key:
 			raise ACMEError('Unknown/unsupported --cert-key-type value: {key_type!r}')
-		ci.csr = csr.sign(ci.key, hashes.SHA256(), crypto_backend)
+		ci.csr = csr.sign(ci.key, crypto_sha256)
 		certs.append(ci)
 	return certs
 
@@ -542,7 +587,8 @@ def domain_auth( acc, domain_set, auth_url,
 	log.debug('Authorized access to domain: {!r}', domain)
 
 
-def cert_issue(acc, ci, cert_domain_list, auth_opts, acme_retry=dict()):
+def cert_issue( acc, ci, cert_domain_list,
+		auth_opts, acme_retry=dict(), auth_parallel=1 ):
 	'Return signed-pem-certificate-chain str for X509CertInfo object (CSR).'
 	acme_retry_wrap = ft.partial(acme_auth_retry, **acme_retry)
 	csr_der = ci.csr.public_bytes(serialization.Encoding.DER)
@@ -563,9 +609,14 @@ def cert_issue(acc, ci, cert_domain_list, auth_opts, acme_retry=dict()):
 	auth_url_final = res['finalize']
 
 	acc.hooks.run('auth.start-all', *auth_domains)
-	for auth_url in res['authorizations']:
-		err = acme_retry_wrap( domain_auth, acc,
-			set(auth_domains), auth_url, **auth_opts )
+	auth_urls, auth_func = res['authorizations'], ft.partial(
+		acme_retry_wrap, domain_auth, acc, set(auth_domains), **auth_opts )
+	if auth_parallel > 1 and len(auth_urls) > 1:
+		import concurrent.futures
+		with concurrent.futures.ThreadPoolExecutor(auth_parallel) as ex:
+			auth_errs = list(ex.map(auth_func, auth_urls))
+	else: auth_errs = map(auth_func, auth_urls) # stops on first error
+	for err in auth_errs:
 		if err: return err
 	acc.hooks.run('auth.done-all', *auth_domains)
 
@@ -642,7 +693,7 @@ def cmd_cert_issue(
 
 
 def main(args=None):
-	import argparse
+	import argparse, textwrap
 
 	dedent = lambda text: (textwrap.dedent(text).strip('\n') + '\n').replace('\t', '  ')
 	class SmartHelpFormatter(argparse.HelpFormatter):
@@ -744,6 +795,7 @@ def main(args=None):
 			Specified path must be executable (chmod +x ...), will be run synchronously, and
 				must exit with 0 for tool to continue operation, and non-zero to abort immediately.
 			Hooks are run with same uid/gid and env as the main script, can use PATH-lookup.
+			Per-domain auth.* hooks can run concurrently, if cert-issue -p/--auth-parallel > 1 is used.
 			See --hook-list output to get full list of
 				all supported hook-points and arguments passed to them.
 			Example spec: -x domain-auth.publish-challenge:/etc/nginx/sync-frontends.sh''')
@@ -839,6 +891,11 @@ def main(args=None):
 	group.add_argument('-m', '--challenge-file-mode', metavar='octal', default='0644',
 		help='Separate access mode (octal) value to use for ACME challenge file in acme_dir directory.'
 			' Default is 0644 to allow read access for any uid (e.g. httpd) to these files.')
+	group.add_argument('-p', '--auth-parallel', metavar='n', type=int, default=1,
+		help='Number of domain authorizations to run in parallel threads, if there are >1 domains.'
+			' Note that with n > 1, all "auth.*" hooks for'
+				' individual domains (except *-all ones) can also run concurrently.'
+			' Default: %(default)s (authorize domains one-by-one)')
 
 	opts = parser.parse_args(sys.argv[1:] if args is None else args)
 
@@ -850,17 +907,19 @@ def main(args=None):
 
 	acc_hooks = AccHooks(opts.hook_timeout)
 	if opts.hook_list:
-		p('Available hook points:\n')
+		print('Available hook points:\n')
 		for hp, desc in acc_hooks.points.items():
-			p('  {}:', hp)
+			print(f'  {hp}:')
 			indent = ' '*4
 			desc = textwrap.fill(desc, width=100, initial_indent=indent, subsequent_indent=indent)\
 				if '\n' not in desc else ''.join(indent + line for line in desc.splitlines(keepends=True))
-			p(desc + '\n')
-		p('Hooks are run synchronously, waiting for subprocess to exit before continuing.')
-		p('All hooks must exit with status 0 to continue operation.')
-		p('Some/most hooks get passed arguments, as mentioned in hook descriptions.')
-		p('Setting --hook-timeout (defaults to 120s) can be used to abort when hook-scripts hang.')
+			print(desc + '\n')
+		print('Hooks are run synchronously, waiting for subprocess to exit before continuing.')
+		print( 'With cert-issue -p/--auth-parallel > 1, per-domain auth.* hooks'
+			' (except auth.*-all ones)\n  can run concurrently for different domains.' )
+		print('All hooks must exit with status 0 to continue operation.')
+		print('Some/most hooks get passed arguments, as mentioned in hook descriptions.')
+		print('Setting --hook-timeout (defaults to 120s) can be used to abort when hook-scripts hang.')
 		return
 	for v in opts.hook or list():
 		if ':' not in v: parser.error(f'Invalid --hook spec (must be hook:path): {v!r}')
@@ -877,20 +936,22 @@ def main(args=None):
 		try: acme_url = acme_ca_shortcuts[acme_url.replace('-', '_')]
 		except KeyError: parser.error(f'Unkown --acme-service shortcut: {acme_url!r}')
 	acme_url = ACMEServer(acme_url)
-	acme_url.d = None
+	acme_url.d = acme_url.nonce = None
 
 	if not opts.account_key_file:
 		parser.error('Path for -k/--account-key-file must be specified.')
-	p_acc_key = pl.Path(opts.account_key_file)
+	p_acc_key, acc_key_buff = pl.Path(opts.account_key_file), None
 	if opts.gen_key or (opts.gen_key_if_missing and not p_acc_key.exists()):
 		acc_key = AccKey.generate_to_file(p_acc_key, opts.key_type, file_mode=file_mode)
 		if not acc_key:
 			parser.error(f'Unknown/unsupported --key-type value: {opts.key_type!r}')
 	elif p_acc_key.exists():
-		acc_key = AccKey.load_from_file(p_acc_key)
+		acc_key_buff = p_acc_key.read_bytes()
+		acc_key = AccKey.load_from_bytes(acc_key_buff)
 		if not acc_key: parser.error(f'Unknown/unsupported key type: {p_acc_key}')
 	else: parser.error(f'Specified --account-key-file path does not exists: {p_acc_key!r}')
-	acc_meta = AccMeta.load_from_key_file(p_acc_key, file_mode=file_mode)
+	acc_meta = AccMeta.load_from_key_file(
+		p_acc_key, file_mode=file_mode, acc_key_buff=acc_key_buff )
 	log.debug( 'Using {} domain key: {} (acme acc url: {})',
 		acc_key.t, acc_key.pk_hash, acc_meta.get('acc.url') )
 
@@ -907,6 +968,7 @@ def main(args=None):
 	acc_key_old = opts.account_key_file_old
 	acc_register = opts.register or acc_key_old or not acc_meta.get('acc.url')
 	acc_contact = opts.contact_email
+	acc_meta_save = False # to store all meta updates to key file at once
 	if not acc_contact.startswith('mailto:'): acc_contact = f'mailto:{acc_contact}'
 
 	payload_reg = {'termsOfServiceAgreed': True}
@@ -922,11 +984,13 @@ def main(args=None):
 				log.debug( 'Both -r/--register and'
 					' -o/--account-key-file-old are specified, acting according to latter option.' )
 			p_acc_key_old = pl.Path(acc_key_old)
-			acc_key_old = AccKey.load_from_file(p_acc_key_old)
+			acc_key_old_buff = p_acc_key_old.read_bytes()
+			acc_key_old = AccKey.load_from_bytes(acc_key_old_buff)
 			if not acc_key_old:
 				parser.error( f'Unknown/unsupported key type'
 					' specified with -o/--account-key-file-old: {p_acc_key}' )
-			acc_meta_old = AccMeta.load_from_key_file(p_acc_key_old)
+			acc_meta_old = AccMeta.load_from_key_file(
+				p_acc_key_old, acc_key_buff=acc_key_old_buff )
 			acc_url_old = acc_meta_old.get('acc.url')
 			if not acc_url_old:
 				log.debug( 'Old key file (-o/--account-key-file-old) does'
@@ -950,9 +1014,7 @@ def main(args=None):
 			acc_meta['acc.url'] = res.headers['Location']
 			if res.code == 201: acc_meta['acc.contact'] = acc_contact
 		else: # keyChange
-			with urlopen(acme_url) as r: # need same-url for both inner and outer payloads
-				assert r.getcode() == 200
-				acme_url.d = adict(json.load(r))
+			acme_dir(acme_url) # need same-url for both inner and outer payloads
 			payload = dict(account=acc_url_old, oldKey=acc_key_old.jwk)
 			payload = signed_req_body( # "inner" JWS with jwk and no nonce
 				acc_key, payload, url=acme_url.d.keyChange, encode=False )
@@ -964,20 +1026,23 @@ def main(args=None):
 			log.debug('Account key-change success: {} -> {}', acc_key_old.pk_hash, acc_key.pk_hash)
 			acc_meta['acc.url'] = acc_url_old
 			acc_meta['acc.contact'] = acc_meta_old.get('acc.contact')
-		acc_meta.save()
+		acc_meta_save = True
 
 	if acc_contact and acc_contact != acc_meta.get('acc.contact'):
 		log.debug('Updating account contact information')
 		res = acme_retry_wrap( signed_req, acc_key, acc_meta['acc.url'],
 			dict(contact=[acc_contact]), kid=acc_meta['acc.url'], acme_url=acme_url )
 		if res.code not in [200, 201, 202]:
+			if acc_meta_save: acc_meta.save() # registration info is still valid
 			p_err('ERROR: ACME account contact info update request failed')
 			return p_err_for_req(res)
 		log.debug(
 			'Account contact info updated: {!r} -> {!r}',
 			acc_meta.get('acc.contact'), acc_contact )
 		acc_meta['acc.contact'] = acc_contact
-		acc_meta.save()
+		acc_meta_save = True
+
+	if acc_meta_save: acc_meta.save()
 
 	acc = AccSetup( acc_key, acc_meta, acc_hooks,
 		ft.partial(signed_req, acc_key, acme_url=acme_url, kid=acc_meta['acc.url']) )
@@ -990,7 +1055,7 @@ def main(args=None):
 		if res.code not in [200, 201, 202]:
 			p_err('ERROR: ACME account info request failed')
 			return p_err_for_req(res)
-		p(res.body.decode())
+		print(res.body.decode())
 
 	elif opts.call == 'account-deactivate':
 		res = acme_retry_wrap( acc.req,
@@ -998,7 +1063,7 @@ def main(args=None):
 		if res.code != 200:
 			p_err('ERROR: ACME account deactivation request failed')
 			return p_err_for_req(res)
-		p(res.body.decode())
+		print(res.body.decode())
 
 
 	elif opts.call == 'cert-issue':
@@ -1029,7 +1094,7 @@ def main(args=None):
 			key_type_list, cert_domain_list, cert_name_attrs,
 			file_mode=file_mode, split_key_file=opts.split_key_file,
 			remove_files_for_prefix=opts.remove_files_for_prefix,
-			auth_opts=auth_opts, acme_retry=acme_retry_opts )
+			auth_opts=auth_opts, acme_retry=acme_retry_opts, auth_parallel=opts.auth_parallel )
 
 	elif not opts.call: parser.error('No command specified')
 	else: parser.error(f'Unrecognized command: {opts.call!r}')